@@ -6,109 +6,182 @@ AI-powered agent for multi-jurisdiction regulatory reporting
 from google.cloud import aiplatform
 from vertexai.generative_models import GenerativeModel, Part, Tool, FunctionDeclaration
 import vertexai
-import json
-from typing import List, Dict, Any
+import asyncio
+import orjson
+import os
+import re
+import weakref
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, ClassVar, Dict, List, Mapping, Optional, Tuple
 from datetime import datetime
+from itertools import product
+import functools
+
+# Upper bound on in-flight Gemini requests per process. The API server runs
+# workflows concurrently, so without this cap every in-flight trade would open
+# its own request at once and peak memory would grow with the number of callers.
+MAX_CONCURRENT_GEMINI = int(os.getenv("MAX_CONCURRENT_GEMINI", "2"))
+
+# One semaphore per event loop, created on first use: an asyncio.Semaphore binds
+# to the loop that first waits on it, and agents outlive a single asyncio.run
+_GEMINI_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _gemini_semaphore() -> asyncio.Semaphore:
+    """The running loop's cap on in-flight Gemini requests"""
+    loop = asyncio.get_running_loop()
+    semaphore = _GEMINI_SEMAPHORES.get(loop)
+    if semaphore is None:
+        semaphore = _GEMINI_SEMAPHORES[loop] = asyncio.Semaphore(MAX_CONCURRENT_GEMINI)
+    return semaphore
+
+# ------------------------------------------------------------------ model
+@functools.lru_cache(maxsize=None)
+def _shared_model(project_id: str, location: str) -> GenerativeModel:
+    """Gemini model for a project/location, created once per process
+
+    The model opens its gRPC channel on first use and keeps it alive, so every
+    agent for the same project and location reuses one pooled connection
+    instead of paying a fresh TLS handshake.
+    """
+    # FIX: use vertexai.init() (not aiplatform.init — different SDK entry point)
+    vertexai.init(project=project_id, location=location)
+    return GenerativeModel("gemini-1.5-pro")
+
+# ------------------------------------------------------------------ tools
+# Built once at import; every agent shares the same declarations
+_JURISDICTION_TOOL = FunctionDeclaration(
+    name="check_jurisdiction",
+    description="Determine which regulatory regimes apply to a trade",
+    parameters={
+        "type": "object",
+        "properties": {
+            "buyer_jurisdiction": {"type": "string"},
+            "seller_jurisdiction": {"type": "string"},
+            "product_type": {"type": "string"},
+            "trade_currency": {"type": "string"},
+        },
+        "required": ["buyer_jurisdiction", "seller_jurisdiction", "product_type"],
+    },
+)
+
+_GEN_TOOL = FunctionDeclaration(
+    name="generate_regulatory_report",
+    description="Generate a regulatory report for a specific regime",
+    parameters={
+        "type": "object",
+        "properties": {
+            "regime": {"type": "string"},
+            "trade_data": {"type": "object"},
+            "uti": {"type": "string"},
+        },
+        "required": ["regime", "trade_data", "uti"],
+    },
+)
+
+_VAL_TOOL = FunctionDeclaration(
+    name="validate_against_schema",
+    description="Validate a regulatory report against schema requirements",
+    parameters={
+        "type": "object",
+        "properties": {
+            "regime": {"type": "string"},
+            "report_data": {"type": "object"},
+        },
+        "required": ["regime", "report_data"],
+    },
+)
+
+_TOOLS = [Tool(function_declarations=[_JURISDICTION_TOOL, _GEN_TOOL, _VAL_TOOL])]
+
+_LEGEND_CORPUS = """
+        Legend OTC Derivatives Model:
+        - CFTC Part 43 requires: UTI, ExecutionTimestamp, Price, Notional, AssetClass, ClearedIndicator
+        - CFTC Part 45 requires: UTI, UPI, ReportingCounterpartyLEI, OtherCounterpartyLEI, EffectiveDate, MaturityDate
+        - EMIR requires: UTI, LEI_1, LEI_2, TradeDate, Notional, Valuation, CollateralPosted
+        - MiFIR requires: ISIN, Quantity, Price, Venue, BuyerLEI, SellerLEI
+        """
 
+# ------------------------------------------------------------ jurisdiction rules
+# Jurisdictions and products precompiled into _REGIME_TABLE; anything else
+# (e.g. EU_GB) goes through the rule chain in _match_regimes
+_JURISDICTIONS = ("US", "EU", "AU", "SG")
+_PRODUCT_TYPES = (
+    "InterestRateSwap",
+    "CrossCurrencySwap",
+    "EquityOption",
+    "EquitySwap",
+    "CreditDefaultSwap",
+    "FxForward",
+    "FxOption",
+    "FxSwap",
+    "CommoditySwap",
+)
+_MIFIR_PRODUCTS = frozenset({"EquityOption", "CreditDefaultSwap"})
 
-class RegulatoryAgent:
-    """
-    AI-powered Regulatory Agent using Vertex AI Gemini
+# One compiled pattern classifies a jurisdiction code; lastgroup names the
+# matching regulator family. EU covers member codes such as EU_GB or EU_FR.
+_JUR_RE = re.compile(r"(?P<us>US)|(?P<au>AU)|(?P<sg>SG)|(?P<eu>EU(?:_[A-Z]+)?)")
 
-    Capabilities:
-    - Intelligent jurisdiction determination
-    - Schema mapping with LLM reasoning
-    - Adaptive rule interpretation
-    - Natural language query of regulations
-    """
 
-    def __init__(self, project_id: str, location: str = "us-central1"):
-        self.project_id = project_id
-        self.location = location
+def _match_regimes(
+    buyer_jurisdiction: str, seller_jurisdiction: str, product_type: str
+) -> Tuple[str, ...]:
+    regimes: List[str] = []
 
-        # FIX: use vertexai.init() (not aiplatform.init — different SDK entry point)
-        vertexai.init(project=project_id, location=location)
+    buyer = _JUR_RE.fullmatch(buyer_jurisdiction)
+    seller = _JUR_RE.fullmatch(seller_jurisdiction)
+    families = (buyer and buyer.lastgroup, seller and seller.lastgroup)
 
-        # Initialize Gemini model
-        self.model = GenerativeModel("gemini-1.5-pro")
+    if "us" in families:
+        regimes.extend(["CFTC_PART_43", "CFTC_PART_45"])
 
-        # Define tools (functions the AI can call)
-        self.tools = self._define_tools()
+    if "eu" in families:
+        regimes.append("EMIR")
+        if product_type in _MIFIR_PRODUCTS:
+            regimes.append("MIFIR")
 
-        # Grounding corpus
-        self.legend_corpus = self._load_legend_models()
-
-    # ------------------------------------------------------------------ tools
-    def _define_tools(self) -> List[Tool]:
-        jurisdiction_check = FunctionDeclaration(
-            name="check_jurisdiction",
-            description="Determine which regulatory regimes apply to a trade",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "buyer_jurisdiction": {"type": "string"},
-                    "seller_jurisdiction": {"type": "string"},
-                    "product_type": {"type": "string"},
-                    "trade_currency": {"type": "string"},
-                },
-                "required": ["buyer_jurisdiction", "seller_jurisdiction", "product_type"],
-            },
-        )
+    if "au" in families:
+        regimes.append("ASIC")
 
-        generate_report = FunctionDeclaration(
-            name="generate_regulatory_report",
-            description="Generate a regulatory report for a specific regime",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "regime": {"type": "string"},
-                    "trade_data": {"type": "object"},
-                    "uti": {"type": "string"},
-                },
-                "required": ["regime", "trade_data", "uti"],
-            },
-        )
+    if "sg" in families:
+        regimes.append("MAS")
 
-        validate_report = FunctionDeclaration(
-            name="validate_against_schema",
-            description="Validate a regulatory report against schema requirements",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "regime": {"type": "string"},
-                    "report_data": {"type": "object"},
-                },
-                "required": ["regime", "report_data"],
-            },
-        )
+    return tuple(regimes)
 
-        return [Tool(function_declarations=[jurisdiction_check, generate_report, validate_report])]
 
-    def _load_legend_models(self) -> str:
-        return """
-        Legend OTC Derivatives Model:
-        - CFTC Part 43 requires: UTI, ExecutionTimestamp, Price, Notional, AssetClass, ClearedIndicator
-        - CFTC Part 45 requires: UTI, UPI, ReportingCounterpartyLEI, OtherCounterpartyLEI, EffectiveDate, MaturityDate
-        - EMIR requires: UTI, LEI_1, LEI_2, TradeDate, Notional, Valuation, CollateralPosted
-        - MiFIR requires: ISIN, Quantity, Price, Venue, BuyerLEI, SellerLEI
-        """
+# Precompiled jurisdiction rules: (buyer, seller, product) -> regimes
+_REGIME_TABLE = {
+    key: _match_regimes(*key) for key in product(_JURISDICTIONS, _JURISDICTIONS, _PRODUCT_TYPES)
+}
 
-    # ---------------------------------------------------------- main entry point
-    async def process_trade_for_reporting(self, trade_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Use AI reasoning to determine and execute regulatory reporting."""
 
-        prompt = f"""
+class RegulatoryAgent:
+    """
+    AI-powered Regulatory Agent using Vertex AI Gemini
+
+    Capabilities:
+    - Intelligent jurisdiction determination
+    - Schema mapping with LLM reasoning
+    - Adaptive rule interpretation
+    - Natural language query of regulations
+    """
+
+    # Reporting prompt; fields missing from the trade render as N/A
+    _PROMPT_TPL: ClassVar[str] = """
         You are a Regulatory Reporting Agent with deep knowledge of global derivatives regulations.
 
         Analyze this trade and determine the complete regulatory reporting strategy:
 
         Trade Details:
-        - Product: {trade_data.get('product_type')}
-        - Asset Class: {trade_data.get('asset_class')}
-        - Buyer: {trade_data.get('buyer')} (Jurisdiction: {trade_data.get('buyer_jurisdiction')})
-        - Seller: {trade_data.get('seller')} (Jurisdiction: {trade_data.get('seller_jurisdiction')})
-        - Notional: {trade_data.get('notional')} {trade_data.get('currency')}
-        - UTI: {trade_data.get('uti')}
+        - Product: {product_type}
+        - Asset Class: {asset_class}
+        - Buyer: {buyer} (Jurisdiction: {buyer_jurisdiction})
+        - Seller: {seller} (Jurisdiction: {seller_jurisdiction})
+        - Notional: {notional} {currency}
+        - UTI: {uti}
 
         Tasks:
         1. Determine ALL applicable regulatory regimes using check_jurisdiction tool
@@ -120,20 +193,194 @@ class RegulatoryAgent:
         Think step-by-step and use tools to execute the reporting workflow.
         """
 
+    # Mandatory report fields per regime, checked by _validate_schema
+    _REQUIRED: ClassVar[Dict[str, frozenset]] = {
+        "CFTC_PART_43": frozenset({"UTI", "ExecutionTimestamp", "AssetClass", "Notional"}),
+        "CFTC_PART_45": frozenset({"UTI", "UPI", "ReportingCounterpartyLEI"}),
+        "EMIR": frozenset({"UTI", "LEI_1", "LEI_2"}),
+    }
+
+    # Report field templates per regime; _generate_report copies one and fills in the trade values
+    _TEMPLATES: ClassVar[Dict[str, Dict[str, Any]]] = {
+        "CFTC_PART_43": {
+            "UTI": None,
+            "ExecutionTimestamp": None,
+            "AssetClass": None,
+            "Price": "N/A",
+            "Notional": None,
+            "ClearedIndicator": False,
+            "BlockTradeIndicator": False,
+        },
+        "CFTC_PART_45": {
+            "UTI": None,
+            "UPI": None,
+            "ReportingCounterpartyLEI": "",
+            "OtherCounterpartyLEI": "",
+            "EffectiveDate": None,
+            "CollateralizationType": "Uncollateralized",
+        },
+        "EMIR": {
+            "UTI": None,
+            "LEI_1": "",
+            "LEI_2": "",
+            "TradeDate": None,
+            "Notional": None,
+            "Valuation": 0.0,
+            "CollateralPosted": 0.0,
+        },
+    }
+
+    def __init__(
+        self,
+        project_id: str,
+        location: str = "us-central1",
+        on_reasoning_chunk: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ):
+        self.project_id = project_id
+        self.location = location
+
+        # Optional async sink for reasoning text as Gemini streams it back
+        self.on_reasoning_chunk = on_reasoning_chunk
+
+        # Initialize Gemini model (shared with every other agent on this project/location)
+        self.model = _shared_model(project_id, location)
+
+        # Tools (functions the AI can call)
+        self.tools = _TOOLS
+
+        # Grounding corpus
+        self.legend_corpus = _LEGEND_CORPUS
+
+        # Tool name -> handler(args, clock), where clock carries the response's timestamps.
+        # Handlers read only the fields they need straight from the function call's
+        # proto map rather than converting it to a dict first.
+        self._dispatch = {
+            "check_jurisdiction": lambda args, clock: self._jurisdiction_report(
+                args["buyer_jurisdiction"],
+                args["seller_jurisdiction"],
+                args["product_type"],
+                args.get("trade_currency", ""),
+            ),
+            "generate_regulatory_report": lambda args, clock: self._generate_report(
+                args["regime"], args["trade_data"], args["uti"], **clock
+            ),
+            "validate_against_schema": lambda args, clock: self._validate_schema(
+                args["regime"], args["report_data"]
+            ),
+        }
+
+    # ---------------------------------------------------------- main entry point
+    def _build_prompt(self, trade_data: Mapping[str, Any]) -> str:
+        return self._PROMPT_TPL.format_map(defaultdict(lambda: "N/A", trade_data))
+
+    def _build_contents(self, trade_data: Mapping[str, Any]) -> List[Any]:
+        contents: List[Any] = [self._build_prompt(trade_data)]
+
+        # Attached documents in GCS are referenced by URI so Gemini reads them directly
+        # instead of the bytes being uploaded through the client with the prompt
+        document_uri = trade_data.get("document_uri")
+        if isinstance(document_uri, str) and document_uri.startswith("gs://"):
+            contents.append(Part.from_uri(document_uri, mime_type="application/pdf"))
+
+        return contents
+
+    async def _generate(
+        self, contents: List[Any], trade_id: Optional[str], clock: Dict[str, str]
+    ) -> Tuple[str, List[Dict]]:
+        """Stream a Gemini response, forwarding reasoning text as it arrives.
+
+        Events carry `trade_id` so subscribers can tell concurrent trades apart.
+        Tool calls are executed as their parts arrive; returns the full reasoning
+        text and the tool results.
+        """
+        texts: List[str] = []
+        results: List[Dict] = []
+
+        # Chunks are handed to a publisher task rather than awaited here, so a slow
+        # subscriber never holds a Gemini slot; the task delivers them in order
+        outbox: Optional[asyncio.Queue] = None
+        publisher: Optional[asyncio.Task] = None
+        if self.on_reasoning_chunk is not None:
+            outbox = asyncio.Queue()
+            publisher = asyncio.create_task(self._publish(self.on_reasoning_chunk, outbox))
+
         try:
-            # FIX: use synchronous generate_content (works reliably across SDK versions)
-            response = self.model.generate_content(
-                contents=[prompt],
-                tools=self.tools,
-                generation_config={"temperature": 0.1},
-            )
+            # Async client call so the event loop keeps serving other requests during the
+            # Gemini round trip; the model's client (and its connection) is reused across calls
+            async with _gemini_semaphore():
+                stream = await self.model.generate_content_async(
+                    contents=contents,
+                    tools=self.tools,
+                    generation_config={"temperature": 0.1},
+                    stream=True,
+                )
+                async for chunk in stream:
+                    # Safety-blocked and feedback-only chunks arrive with no candidates
+                    if not chunk.candidates:
+                        continue
+                    text, chunk_results = self._execute_tool_calls(
+                        chunk.candidates[0].content.parts, clock
+                    )
+                    results.extend(chunk_results)
+                    if text:
+                        texts.append(text)
+                        if outbox is not None:
+                            outbox.put_nowait({"type": "reasoning_chunk", "trade_id": trade_id, "text": text})
+        except Exception as e:
+            if publisher is not None:
+                # Subscribers already saw partial reasoning; tell them it will not finish
+                # before the caller falls back to the rule-based report
+                if texts:
+                    outbox.put_nowait({"type": "reasoning_aborted", "trade_id": trade_id, "error": str(e)})
+                outbox.put_nowait(None)
+                await publisher
+            raise
+        except BaseException:
+            if publisher is not None:
+                publisher.cancel()
+            raise
+
+        # Wait for delivery outside the semaphore
+        if publisher is not None:
+            outbox.put_nowait(None)
+            await publisher
+
+        return "".join(texts), results
+
+    @staticmethod
+    async def _publish(
+        sink: Callable[[Dict[str, Any]], Awaitable[None]], outbox: asyncio.Queue
+    ) -> None:
+        """Deliver queued messages to `sink` in order until the None sentinel"""
+        while (message := await outbox.get()) is not None:
+            try:
+                await sink(message)
+            except Exception as e:
+                print(f"[RegulatoryAgent] Reasoning subscriber failed: {e}")
+
+    @staticmethod
+    def _clock(now: datetime) -> Dict[str, str]:
+        return {"now_iso": now.isoformat(), "date_iso": now.date().isoformat()}
+
+    async def process_trade_for_reporting(
+        self, trade_data: Mapping[str, Any], trade_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Use AI reasoning to determine and execute regulatory reporting.
+
+        `trade_id` keys the streamed reasoning events; it defaults to the trade's own.
+        """
 
-            results = self._execute_tool_calls(response)
+        clock = self._clock(datetime.now())
+        contents = self._build_contents(trade_data)
 
+        try:
+            text, results = await self._generate(
+                contents, trade_id if trade_id is not None else trade_data.get("trade_id"), clock
+            )
             return {
-                "reasoning": response.text if hasattr(response, "text") else str(response),
+                "reasoning": text,
                 "reports_generated": results,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": clock["now_iso"],
             }
         except Exception as e:
             # FIX: graceful fallback so dev/testing works without Gemini quota
@@ -141,110 +388,109 @@ class RegulatoryAgent:
             return self._fallback_reporting(trade_data)
 
     # ---------------------------------------------------------- tool execution
-    def _execute_tool_calls(self, response) -> List[Dict]:
-        results = []
+    def _execute_tool_calls(self, parts: List[Any], clock: Dict[str, str]) -> Tuple[str, List[Dict]]:
+        """Walk response parts once, collecting reasoning text and executing tool calls."""
+        # Tool calls run one after another on purpose: concurrency is already
+        # bounded a level up by the Gemini semaphore, and fanning out here only
+        # raises peak memory without adding throughput.
+        texts: List[str] = []
+        results: List[Dict] = []
         try:
-            for part in response.candidates[0].content.parts:
-                if hasattr(part, "function_call"):
+            for part in parts:
+                if hasattr(part, "text") and part.text:
+                    texts.append(part.text)
+                elif hasattr(part, "function_call"):
                     fc = part.function_call
-                    if fc.name == "check_jurisdiction":
-                        results.append(self._check_jurisdiction(**dict(fc.args)))
-                    elif fc.name == "generate_regulatory_report":
-                        results.append(self._generate_report(**dict(fc.args)))
-                    elif fc.name == "validate_against_schema":
-                        results.append(self._validate_schema(**dict(fc.args)))
+                    handler = self._dispatch.get(fc.name)
+                    if handler is not None:
+                        results.append(handler(fc.args, clock))
         except (AttributeError, IndexError) as e:
             print(f"[RegulatoryAgent] Error processing tool calls: {e}")
-        return results
+        return "".join(texts), results
 
     # ---------------------------------------------------------- fallback
-    def _fallback_reporting(self, trade_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _fallback_reporting(self, trade_data: Mapping[str, Any]) -> Dict[str, Any]:
         """Rule-based fallback when Gemini API is unavailable."""
-        jur = self._check_jurisdiction(
-            buyer_jurisdiction=trade_data.get("buyer_jurisdiction", ""),
-            seller_jurisdiction=trade_data.get("seller_jurisdiction", ""),
-            product_type=trade_data.get("product_type", ""),
-            trade_currency=trade_data.get("currency", ""),
+        clock = self._clock(datetime.now())
+
+        regimes = self._check_jurisdiction(
+            trade_data.get("buyer_jurisdiction", ""),
+            trade_data.get("seller_jurisdiction", ""),
+            trade_data.get("product_type", ""),
+            trade_data.get("currency", ""),
         )
 
         reports = []
-        for regime in jur["applicable_regimes"]:
+        for regime in regimes:
             reports.append(
                 self._generate_report(
                     regime=regime,
                     trade_data=trade_data,
                     uti=trade_data.get("uti", "UTI-UNKNOWN"),
+                    **clock,
                 )
             )
 
         return {
             "reasoning": "Rule-based fallback (AI unavailable)",
             "reports_generated": reports,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": clock["now_iso"],
+            "fallback": True,
         }
 
     # -------------------------------------------------------- tool implementations
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
     def _check_jurisdiction(
+        buyer_jurisdiction: str,
+        seller_jurisdiction: str,
+        product_type: str,
+        trade_currency: str = "",
+    ) -> Tuple[str, ...]:
+        regimes = _REGIME_TABLE.get((buyer_jurisdiction, seller_jurisdiction, product_type))
+        if regimes is None:
+            regimes = _match_regimes(buyer_jurisdiction, seller_jurisdiction, product_type)
+        return regimes
+
+    def _jurisdiction_report(
         self,
         buyer_jurisdiction: str,
         seller_jurisdiction: str,
         product_type: str,
         trade_currency: str = "",
     ) -> Dict:
-        regimes: List[str] = []
-
-        if buyer_jurisdiction == "US" or seller_jurisdiction == "US":
-            regimes.extend(["CFTC_PART_43", "CFTC_PART_45"])
-
-        if "EU" in buyer_jurisdiction or "EU" in seller_jurisdiction:
-            regimes.append("EMIR")
-            if product_type in ["EquityOption", "CreditDefaultSwap"]:
-                regimes.append("MIFIR")
-
-        if buyer_jurisdiction == "AU" or seller_jurisdiction == "AU":
-            regimes.append("ASIC")
-
-        if buyer_jurisdiction == "SG" or seller_jurisdiction == "SG":
-            regimes.append("MAS")
-
         return {
-            "applicable_regimes": regimes,
+            "applicable_regimes": self._check_jurisdiction(
+                buyer_jurisdiction, seller_jurisdiction, product_type, trade_currency
+            ),
             "confidence": "high",
             "reasoning": f"Based on jurisdictions {buyer_jurisdiction}/{seller_jurisdiction}",
         }
 
-    def _generate_report(self, regime: str, trade_data: Dict, uti: str) -> Dict:
-        fields: Dict[str, Any] = {}
+    def _generate_report(
+        self, regime: str, trade_data: Mapping[str, Any], uti: str, *, now_iso: str, date_iso: str
+    ) -> Dict:
+        template = self._TEMPLATES.get(regime)
+        fields: Dict[str, Any] = {} if template is None else template.copy()
 
         if regime == "CFTC_PART_43":
-            fields = {
-                "UTI": uti,
-                "ExecutionTimestamp": datetime.now().isoformat(),
-                "AssetClass": trade_data.get("asset_class"),
-                "Price": trade_data.get("price", "N/A"),
-                "Notional": trade_data.get("notional"),
-                "ClearedIndicator": False,
-                "BlockTradeIndicator": False,
-            }
+            fields["UTI"] = uti
+            fields["ExecutionTimestamp"] = now_iso
+            fields["AssetClass"] = trade_data.get("asset_class")
+            fields["Price"] = trade_data.get("price", "N/A")
+            fields["Notional"] = trade_data.get("notional")
         elif regime == "CFTC_PART_45":
-            fields = {
-                "UTI": uti,
-                "UPI": f"UPI-{trade_data.get('product_type')}",
-                "ReportingCounterpartyLEI": trade_data.get("buyer_lei", ""),
-                "OtherCounterpartyLEI": trade_data.get("seller_lei", ""),
-                "EffectiveDate": datetime.now().date().isoformat(),
-                "CollateralizationType": "Uncollateralized",
-            }
+            fields["UTI"] = uti
+            fields["UPI"] = f"UPI-{trade_data.get('product_type')}"
+            fields["ReportingCounterpartyLEI"] = trade_data.get("buyer_lei", "")
+            fields["OtherCounterpartyLEI"] = trade_data.get("seller_lei", "")
+            fields["EffectiveDate"] = date_iso
         elif regime == "EMIR":
-            fields = {
-                "UTI": uti,
-                "LEI_1": trade_data.get("buyer_lei", ""),
-                "LEI_2": trade_data.get("seller_lei", ""),
-                "TradeDate": datetime.now().date().isoformat(),
-                "Notional": trade_data.get("notional"),
-                "Valuation": 0.0,
-                "CollateralPosted": 0.0,
-            }
+            fields["UTI"] = uti
+            fields["LEI_1"] = trade_data.get("buyer_lei", "")
+            fields["LEI_2"] = trade_data.get("seller_lei", "")
+            fields["TradeDate"] = date_iso
+            fields["Notional"] = trade_data.get("notional")
 
         return {
             "regime": regime,
@@ -254,23 +500,14 @@ class RegulatoryAgent:
         }
 
     def _validate_schema(self, regime: str, report_data: Dict) -> Dict:
-        required_fields = {
-            "CFTC_PART_43": ["UTI", "ExecutionTimestamp", "AssetClass", "Notional"],
-            "CFTC_PART_45": ["UTI", "UPI", "ReportingCounterpartyLEI"],
-            "EMIR": ["UTI", "LEI_1", "LEI_2"],
-        }
-
-        missing = [
-            f for f in required_fields.get(regime, []) if f not in report_data.get("fields", {})
-        ]
+        required = self._REQUIRED.get(regime, frozenset())
+        missing = sorted(required - report_data.get("fields", {}).keys())
 
         return {"valid": len(missing) == 0, "missing_fields": missing, "regime": regime}
 
 
 # ------------------------------------------------------------------- main
 if __name__ == "__main__":
-    import asyncio
-
     agent = RegulatoryAgent(project_id="nextgen3")
 
     sample_trade = {
@@ -288,4 +525,4 @@ if __name__ == "__main__":
     }
 
     result = asyncio.run(agent.process_trade_for_reporting(sample_trade))
-    print(json.dumps(result, indent=2))
+    print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
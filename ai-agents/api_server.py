@@ -5,10 +5,10 @@ Exposes REST API and WebSocket for real-time workflow execution
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 import asyncio
-import json
-from typing import Dict
+import orjson
+from typing import Any, Dict, List, Mapping, Optional
 from workflows.multi_agent_workflow import TradeProcessingWorkflow
 
 app = FastAPI(title="AI Agent Workflow API")
@@ -23,12 +23,18 @@ app.add_middleware(
 )
 
 # Active WebSocket connections
-active_connections: list[WebSocket] = []
+active_connections: set[WebSocket] = set()
 
-# Workflow instance
-workflow = None
+# Upper bound on concurrent sends per broadcast
+BROADCAST_CONCURRENCY = 32
+
+# One workflow serves every request: runs keep their state in the graph, and the
+# regulatory agent's Gemini semaphore is what bounds concurrent model calls
+workflow: Optional[TradeProcessingWorkflow] = None
 
 class TradeRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
     trade_id: str
     product_type: str
     buyer_jurisdiction: str
@@ -36,19 +42,46 @@ class TradeRequest(BaseModel):
     notional: float = 10000000
     currency: str = "USD"
 
+# Declared response models let FastAPI serialize straight to JSON bytes through
+# pydantic's core, without a jsonable_encoder pass. Validation also turns the
+# read-only trade view in the workflow state into a plain dict.
+class WorkflowInputs(BaseModel):
+    trade_id: str
+    trade_data: Dict[str, Any]
+    uti: str
+    netting_set: str
+
+class WorkflowResult(BaseModel):
+    inputs: WorkflowInputs
+    outputs: Optional[Dict[str, Any]] = None
+    current_step: str
+    proceed_key: str
+    errors: Optional[List[str]] = None
+    completed_mask: int
+
+class WorkflowResponse(BaseModel):
+    status: str
+    result: WorkflowResult
+
+class HealthResponse(BaseModel):
+    status: str
+    agents: int
+
 @app.on_event("startup")
 async def startup_event():
     global workflow
     # Initialize workflow with your GCP project
     workflow = TradeProcessingWorkflow(project_id="nextgen3")
+    # Stream Gemini reasoning to WebSocket clients as it is generated
+    workflow.regulatory_agent.on_reasoning_chunk = broadcast_update
 
-@app.post("/workflow/execute")
+@app.post("/workflow/execute", response_model=WorkflowResponse)
 async def execute_workflow(trade: TradeRequest):
     """Execute the multi-agent workflow for a trade"""
     
-    trade_data = trade.dict()
+    trade_data = trade.model_dump()
     
-    # Execute workflow
+    # Run in this handler's task, so a client disconnect cancels the workflow with it
     result = await workflow.execute(trade_data)
     
     # Broadcast to connected WebSocket clients
@@ -63,7 +96,7 @@ async def execute_workflow(trade: TradeRequest):
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket for real-time workflow updates"""
     await websocket.accept()
-    active_connections.append(websocket)
+    active_connections.add(websocket)
     
     try:
         while True:
@@ -74,17 +107,36 @@ async def websocket_endpoint(websocket: WebSocket):
             await websocket.send_text(f"Received: {data}")
     
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
+        active_connections.discard(websocket)
+
+def _json_default(obj: Any):
+    """orjson fallback for the read-only trade mappings in workflow states"""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError
 
 async def broadcast_update(message: Dict):
     """Broadcast workflow updates to all connected clients"""
-    for connection in active_connections:
-        await connection.send_text(json.dumps(message))
+    payload = orjson.dumps(message, default=_json_default).decode()
+    connections = list(active_connections)
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+    async def send(connection: WebSocket):
+        async with semaphore:
+            await connection.send_text(payload)
+
+    results = await asyncio.gather(*(send(c) for c in connections), return_exceptions=True)
+
+    # Drop clients whose send failed
+    for connection, result in zip(connections, results):
+        if isinstance(result, Exception):
+            active_connections.discard(connection)
 
-@app.get("/health")
+@app.get("/health", response_model=HealthResponse)
 async def health_check():
     return {"status": "healthy", "agents": 7}
 
 if __name__ == "__main__":
     import uvicorn
+    # uvicorn's default loop setting already picks uvloop when it is installed
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,140 @@
+"""
+Shared fixtures for the agent and workflow tests
+
+Gemini is never called: when the Vertex AI SDK is not installed, minimal stand-ins
+for the modules the agents import are registered, and every test drives the
+model through FakeModel.
+"""
+
+import asyncio
+import sys
+import types
+
+import pytest
+
+
+def _install_vertexai_stub():
+    google = sys.modules.setdefault("google", types.ModuleType("google"))
+    cloud = types.ModuleType("google.cloud")
+    aiplatform = types.ModuleType("google.cloud.aiplatform")
+    google.cloud = cloud
+    cloud.aiplatform = aiplatform
+
+    vertexai = types.ModuleType("vertexai")
+    vertexai.init = lambda **kwargs: None
+    generative_models = types.ModuleType("vertexai.generative_models")
+
+    class _Declaration:
+        def __init__(self, *args, **kwargs):
+            self.args, self.kwargs = args, kwargs
+
+        @classmethod
+        def from_uri(cls, *args, **kwargs):
+            return cls(*args, **kwargs)
+
+    class GenerativeModel(_Declaration):
+        async def generate_content_async(self, *args, **kwargs):
+            raise RuntimeError("Vertex AI is stubbed in tests")
+
+    generative_models.GenerativeModel = GenerativeModel
+    generative_models.Part = _Declaration
+    generative_models.Tool = _Declaration
+    generative_models.FunctionDeclaration = _Declaration
+    vertexai.generative_models = generative_models
+
+    sys.modules.update({
+        "google.cloud": cloud,
+        "google.cloud.aiplatform": aiplatform,
+        "vertexai": vertexai,
+        "vertexai.generative_models": generative_models,
+    })
+
+
+try:
+    import vertexai.generative_models  # noqa: F401
+except ImportError:
+    _install_vertexai_stub()
+
+
+class _Obj:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+def text_chunk(text):
+    """A streamed response chunk carrying reasoning text"""
+    return _Obj(candidates=[_Obj(content=_Obj(parts=[_Obj(text=text)]))])
+
+
+def tool_chunk(name, args):
+    """A streamed response chunk carrying one function call"""
+    call = _Obj(name=name, args=args)
+    return _Obj(candidates=[_Obj(content=_Obj(parts=[_Obj(function_call=call)]))])
+
+
+def report_chunk(trade, regime="EMIR"):
+    """A chunk in which Gemini asks for one report on `trade`"""
+    return tool_chunk(
+        "generate_regulatory_report",
+        {"regime": regime, "trade_data": trade, "uti": "UTI-GEMINI"},
+    )
+
+
+class FakeModel:
+    """Stands in for GenerativeModel; streams the queued chunks or raises
+
+    `error` fails the call itself, `stream_error` fails the stream after the chunks
+    """
+
+    def __init__(self, chunks=(), error=None, delay=0, stream_error=None):
+        self.chunks = list(chunks)
+        self.error = error
+        self.stream_error = stream_error
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_content_async(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+
+        async def stream():
+            for chunk in self.chunks:
+                yield chunk
+            if self.stream_error is not None:
+                raise self.stream_error
+
+        return stream()
+
+
+@pytest.fixture
+def fake_model():
+    return FakeModel()
+
+
+@pytest.fixture
+def workflow(fake_model):
+    """A workflow whose regulatory agent talks to fake_model, isolated from other tests"""
+    from workflows.multi_agent_workflow import TradeProcessingWorkflow
+
+    TradeProcessingWorkflow._AGENT_REGISTRY.clear()
+    wf = TradeProcessingWorkflow(project_id="test-project")
+    wf.regulatory_agent.model = fake_model
+    yield wf
+    TradeProcessingWorkflow._AGENT_REGISTRY.clear()
+
+
+@pytest.fixture
+def trade():
+    return {
+        "trade_id": "TRD-1",
+        "product_type": "EquityOption",
+        "asset_class": "Equity",
+        "buyer_jurisdiction": "US",
+        "seller_jurisdiction": "EU_GB",
+        "buyer_lei": "LEI-BUY",
+        "seller_lei": "LEI-SELL",
+        "notional": 5000000,
+        "currency": "USD",
+    }
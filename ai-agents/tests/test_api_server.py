@@ -0,0 +1,86 @@
+import asyncio
+import warnings
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import api_server
+from api_server import TradeRequest, app, execute_workflow
+from fastapi.testclient import TestClient
+
+
+class FakeWorkflow:
+    """Returns a result naming the run; runs listed in `hold` wait for release()"""
+
+    def __init__(self):
+        self.runs = 0
+        self.cancelled = 0
+        self.hold = set()
+        self.released = asyncio.Event()
+
+    async def execute(self, trade_data):
+        self.runs += 1
+        run = self.runs
+        if run in self.hold:
+            try:
+                await self.released.wait()
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return {"trade_id": trade_data["trade_id"], "run": run}
+
+
+@pytest.fixture
+def fake_workflow(monkeypatch):
+    wf = FakeWorkflow()
+    monkeypatch.setattr(api_server, "workflow", wf)
+    return wf
+
+
+def _request(trade_id="TRD-1"):
+    return TradeRequest(
+        trade_id=trade_id, product_type="EquityOption",
+        buyer_jurisdiction="US", seller_jurisdiction="EU_GB",
+    )
+
+
+async def test_concurrent_submissions_each_get_their_own_run(fake_workflow):
+    fake_workflow.hold.add(1)
+    first = asyncio.create_task(execute_workflow(_request()))
+    await asyncio.sleep(0)
+
+    # A retry while the first request is still running is served, not rejected
+    assert (await execute_workflow(_request()))["result"]["run"] == 2
+
+    fake_workflow.released.set()
+    assert (await first)["result"]["run"] == 1
+
+
+async def test_cancelled_request_cancels_its_run(fake_workflow):
+    fake_workflow.hold.add(1)
+    first = asyncio.create_task(execute_workflow(_request()))
+    await asyncio.sleep(0)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    assert fake_workflow.cancelled == 1
+
+    # A resubmission gets its own run's result, never the cancelled one's
+    response = await execute_workflow(_request())
+    assert response["result"] == {"trade_id": "TRD-1", "run": 2}
+
+
+def test_execute_serializes_the_workflow_state(workflow, trade, monkeypatch):
+    monkeypatch.setattr(api_server, "workflow", workflow)
+    body = {k: trade[k] for k in TradeRequest.model_fields if k in trade}
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        response = TestClient(app).post("/workflow/execute", json=body)
+
+    assert response.status_code == 200
+    result = response.json()["result"]
+    assert result["inputs"]["trade_data"]["trade_id"] == "TRD-1"
+    assert result["outputs"]["settlement"]["instructions"][0]["instruction_id"] == "SI-001"
@@ -0,0 +1,101 @@
+import asyncio
+import weakref
+
+import pytest
+
+from agents import regulatory_agent
+from agents.regulatory_agent import RegulatoryAgent, _match_regimes
+from conftest import FakeModel, _Obj, text_chunk
+
+
+@pytest.mark.parametrize(
+    "buyer, seller, product, expected",
+    [
+        ("US", "EU_GB", "EquityOption", ("CFTC_PART_43", "CFTC_PART_45", "EMIR", "MIFIR")),
+        ("US", "EU", "InterestRateSwap", ("CFTC_PART_43", "CFTC_PART_45", "EMIR")),
+        ("AU", "SG", "FxForward", ("ASIC", "MAS")),
+        ("EUR", "JP", "FxForward", ()),
+        ("", "", "", ()),
+    ],
+)
+def test_match_regimes(buyer, seller, product, expected):
+    assert _match_regimes(buyer, seller, product) == expected
+
+
+def test_table_and_rule_chain_agree():
+    assert RegulatoryAgent._check_jurisdiction("US", "EU", "EquityOption") == _match_regimes(
+        "US", "EU", "EquityOption"
+    )
+    assert RegulatoryAgent._check_jurisdiction("EU_FR", "SG", "EquityOption") == (
+        "EMIR", "MIFIR", "MAS"
+    )
+
+
+@pytest.fixture
+def agent():
+    agent = RegulatoryAgent(project_id="test-project")
+    agent.model = FakeModel(chunks=[text_chunk("thinking")], delay=0.01)
+    return agent
+
+
+def test_semaphore_works_across_event_loops(agent, trade, monkeypatch):
+    monkeypatch.setattr(regulatory_agent, "MAX_CONCURRENT_GEMINI", 1)
+    monkeypatch.setattr(regulatory_agent, "_GEMINI_SEMAPHORES", weakref.WeakKeyDictionary())
+
+    async def contend():
+        return await asyncio.gather(*(agent.process_trade_for_reporting(trade) for _ in range(3)))
+
+    # Separate asyncio.run calls, as in scripts and tests, each contending for the cap
+    for _ in range(2):
+        results = asyncio.run(contend())
+        assert [r["reasoning"] for r in results] == ["thinking"] * 3
+
+
+async def test_slow_subscriber_does_not_hold_a_gemini_slot(agent, trade, monkeypatch):
+    monkeypatch.setattr(regulatory_agent, "MAX_CONCURRENT_GEMINI", 1)
+    monkeypatch.setattr(regulatory_agent, "_GEMINI_SEMAPHORES", weakref.WeakKeyDictionary())
+
+    delivered = []
+    release = asyncio.Event()
+
+    async def slow_subscriber(message):
+        await release.wait()
+        delivered.append(message)
+
+    agent.on_reasoning_chunk = slow_subscriber
+    agent.model.chunks = [text_chunk("one"), text_chunk("two")]
+    streaming = asyncio.create_task(agent.process_trade_for_reporting(trade))
+    await asyncio.sleep(0.05)
+
+    # The first trade is stuck publishing, yet another request gets the only slot
+    other = RegulatoryAgent(project_id="test-project")
+    other.model = FakeModel(chunks=[text_chunk("other")])
+    assert (await asyncio.wait_for(other.process_trade_for_reporting(trade), 1))["reasoning"] == "other"
+
+    release.set()
+    assert (await streaming)["reasoning"] == "onetwo"
+    assert [m["text"] for m in delivered] == ["one", "two"]
+
+
+async def test_chunks_without_candidates_are_skipped(agent, trade):
+    agent.model.chunks = [text_chunk("one"), _Obj(candidates=[]), text_chunk("two")]
+    result = await agent.process_trade_for_reporting(trade)
+    assert result["reasoning"] == "onetwo"
+    assert "fallback" not in result
+
+
+async def test_stream_failure_aborts_reasoning_before_fallback(agent, trade):
+    delivered = []
+
+    async def subscriber(message):
+        delivered.append(message)
+
+    agent.on_reasoning_chunk = subscriber
+    agent.model.chunks = [text_chunk("partial")]
+    agent.model.stream_error = RuntimeError("stream reset")
+    result = await agent.process_trade_for_reporting(trade)
+
+    assert result["fallback"] is True
+    assert [m["type"] for m in delivered] == ["reasoning_chunk", "reasoning_aborted"]
+    assert delivered[1]["error"] == "stream reset"
+    assert {m["trade_id"] for m in delivered} == {"TRD-1"}
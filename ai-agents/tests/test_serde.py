@@ -0,0 +1,68 @@
+import datetime
+import math
+from types import MappingProxyType
+
+import pytest
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from workflows.multi_agent_workflow import OrjsonSerializer, TradeInputs, TradeWorkflowState
+
+
+@pytest.fixture
+def serde():
+    return OrjsonSerializer()
+
+
+def _round_trip(serde, value):
+    return serde.loads_typed(serde.dumps_typed(value))
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        {"reports": [{"regime": "EMIR", "fields": {"Notional": 5.5, "Cleared": False}}]},
+        ["a", 1, None, True],
+        "text",
+        ("US", "EU"),
+        {"applicable_regimes": ("EMIR", "MIFIR")},
+        {1: "non-str key"},
+        {"ts": datetime.datetime(2024, 1, 2, 3, 4, 5)},
+        {"fields": {"Valuation": float("inf")}},
+        {"fields": {"Valuation": -float("inf")}},
+    ],
+)
+def test_round_trip_matches_jsonplus(serde, value):
+    expected = _round_trip(JsonPlusSerializer(), value)
+    restored = _round_trip(serde, value)
+
+    assert restored == expected
+    assert type(restored) is type(expected)
+
+
+def test_plain_values_take_the_orjson_path(serde):
+    assert serde.dumps_typed({"a": [1, 2.5, "x"], "b": ("y",)})[0] == "orjson"
+
+
+@pytest.mark.parametrize("value", [float("nan"), {"a": float("inf")}, {"ts": datetime.date(2024, 1, 2)}])
+def test_values_orjson_would_change_fall_back(serde, value):
+    assert serde.dumps_typed(value)[0] != "orjson"
+
+
+def test_nan_keeps_its_value(serde):
+    assert math.isnan(_round_trip(serde, [float("nan")])[0])
+
+
+def test_read_only_mapping_is_stored_as_dict(serde):
+    frozen = {"trade_data": MappingProxyType({"notional": 5})}
+    kind, payload = serde.dumps_typed(frozen)
+
+    assert kind == "orjson"
+    assert serde.loads_typed((kind, payload)) == {"trade_data": {"notional": 5}}
+
+
+def test_dataclass_state_keeps_its_type(serde):
+    state = TradeWorkflowState(inputs=TradeInputs(trade_id="T", trade_data={}, uti="", netting_set=""))
+    kind, payload = serde.dumps_typed(state)
+
+    assert kind != "orjson"
+    assert serde.loads_typed((kind, payload)) == state
@@ -0,0 +1,248 @@
+import asyncio
+from types import MappingProxyType
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from conftest import report_chunk, text_chunk
+from workflows.multi_agent_workflow import (
+    AGENT_BITS,
+    OrjsonSerializer,
+    TradeProcessingWorkflow,
+    _list_extend,
+    _merge_outputs,
+    completed_agent_names,
+)
+
+
+async def test_execute_runs_every_agent(workflow, trade):
+    result = await workflow.execute(dict(trade))
+
+    assert result["current_step"] == "functional_complete"
+    assert completed_agent_names(result["completed_mask"]) == list(AGENT_BITS)
+
+
+async def test_regulatory_skipped_when_no_regime_applies(workflow, fake_model, trade):
+    trade.pop("buyer_jurisdiction")
+    trade["seller_jurisdiction"] = "JP"
+    result = await workflow.execute(trade)
+
+    assert result["outputs"]["regulatory"] == {"reports": []}
+    assert fake_model.calls == 0
+
+    # The empty result is the trade's own, not one shared by every skipped trade
+    result["outputs"]["regulatory"]["reports"].append({"regime": "INJECTED"})
+    assert (await workflow.execute(trade))["outputs"]["regulatory"] == {"reports": []}
+
+
+async def test_regulatory_runs_for_seller_side_regimes(workflow, fake_model, trade):
+    trade["buyer_jurisdiction"] = ""
+    trade["seller_jurisdiction"] = "US"
+    fake_model.chunks = [report_chunk(trade, regime="CFTC_PART_45")]
+    result = await workflow.execute(trade)
+
+    assert fake_model.calls == 1
+    assert [r["regime"] for r in result["outputs"]["regulatory"]["reports"]] == ["CFTC_PART_45"]
+
+
+async def test_reject_stops_after_processing(workflow, trade, monkeypatch):
+    monkeypatch.setattr(type(workflow), "_VALIDATION_RESULT", {"valid": False})
+    result = await workflow.execute(trade)
+
+    assert completed_agent_names(result["completed_mask"]) == ["trading", "processing"]
+    assert "regulatory" not in result["outputs"]
+
+
+async def test_execute_stream_yields_in_completion_order(workflow, trade, monkeypatch):
+    async def slow_margin(state):
+        await asyncio.sleep(0.05)
+        return {"outputs": {"margin": {}}, "completed_mask": AGENT_BITS["margin"]}
+
+    async def broken_ledger(state):
+        raise ValueError("ledger down")
+
+    monkeypatch.setattr(workflow, "_margin_agent_node", slow_margin)
+    monkeypatch.setattr(workflow, "_ledger_agent_node", broken_ledger)
+
+    seen = [(agent, update) async for agent, update in workflow.execute_stream(trade)]
+    agents = [agent for agent, _ in seen]
+
+    assert agents[:2] == ["trading", "processing"]
+    assert agents[-1] == "margin"
+    assert sorted(agents[2:]) == sorted(["regulatory", "confirmation", "settlement", "ledger", "margin"])
+    assert dict(seen)["ledger"] == {"errors": ["ledger: ledger down"]}
+
+
+async def test_closing_execute_stream_cancels_unfinished_agents(workflow, trade, monkeypatch):
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def slow_margin(state):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        finally:
+            cancelled.set()
+
+    monkeypatch.setattr(workflow, "_margin_agent_node", slow_margin)
+
+    stream = workflow.execute_stream(trade)
+    async for agent, _ in stream:
+        if agent == "regulatory":
+            break
+    await stream.aclose()
+
+    assert started.is_set()
+    await asyncio.wait_for(cancelled.wait(), 1)
+
+
+async def test_regulatory_reports_are_cached(workflow, fake_model, trade):
+    fake_model.chunks = [report_chunk(trade)]
+
+    first = await workflow.execute(dict(trade))
+    second = await workflow.execute(dict(trade, trade_id="TRD-2"))
+
+    assert fake_model.calls == 1
+    assert first["outputs"]["regulatory"] == second["outputs"]["regulatory"]
+
+
+async def test_fallback_reports_are_not_cached(workflow, fake_model, trade):
+    fake_model.error = RuntimeError("quota exceeded")
+    degraded = await workflow.execute(dict(trade))
+    assert degraded["outputs"]["regulatory"]["reports"]
+
+    # Gemini recovers: the same trade must reach it instead of replaying the fallback
+    fake_model.error = None
+    fake_model.chunks = [report_chunk(trade)]
+    recovered = await workflow.execute(dict(trade))
+
+    assert fake_model.calls == 2
+    assert [r["report_id"] for r in recovered["outputs"]["regulatory"]["reports"]] == [
+        "RPT-EMIR-UTI-GEMI"
+    ]
+
+
+async def test_cached_reports_are_not_shared(workflow, fake_model, trade):
+    fake_model.chunks = [report_chunk(trade)]
+
+    first = await workflow.execute(dict(trade))
+    first["outputs"]["regulatory"]["reports"][0]["fields"]["UTI"] = "EDITED"
+    second = await workflow.execute(dict(trade))
+    third = await workflow.execute(dict(trade))
+
+    reports = second["outputs"]["regulatory"]["reports"]
+    assert reports[0]["fields"]["UTI"] == "UTI-GEMINI"
+    assert reports is not third["outputs"]["regulatory"]["reports"]
+
+
+async def test_agent_results_are_not_shared_between_trades(workflow, trade):
+    first = await workflow.execute(dict(trade))
+    for output in first["outputs"].values():
+        output["injected"] = True
+    first["outputs"]["settlement"]["instructions"].append({"instruction_id": "SI-XXX"})
+    first["outputs"]["ledger"]["entries"].clear()
+
+    second = await workflow.execute(dict(trade))
+    assert not any("injected" in output for output in second["outputs"].values())
+    assert len(second["outputs"]["settlement"]["instructions"]) == 1
+    assert len(second["outputs"]["ledger"]["entries"]) == 3
+
+
+async def test_trade_id_is_read_from_api_payload(workflow, trade):
+    result = await workflow.execute(dict(trade))
+
+    assert result["inputs"]["trade_id"] == "TRD-1"
+    assert result["inputs"]["uti"] == "UTI-TRD-1"
+
+
+async def test_reasoning_events_carry_the_trade_id(workflow, fake_model, trade):
+    delivered = []
+
+    async def subscriber(message):
+        delivered.append(message)
+
+    workflow.regulatory_agent.on_reasoning_chunk = subscriber
+    fake_model.chunks = [text_chunk("thinking")]
+    trade["id"] = trade.pop("trade_id")
+    await workflow.execute(trade)
+
+    assert [(m["type"], m["trade_id"]) for m in delivered] == [("reasoning_chunk", "TRD-1")]
+
+
+async def test_checkpointed_reruns_do_not_inherit_state(fake_model, trade, monkeypatch):
+    TradeProcessingWorkflow._AGENT_REGISTRY.clear()
+    wf = TradeProcessingWorkflow("test-project", checkpointer=InMemorySaver(serde=OrjsonSerializer()))
+    wf.regulatory_agent.model = fake_model
+
+    async def broken_ledger(state):
+        raise ValueError("ledger down")
+
+    monkeypatch.setattr(wf, "_ledger_agent_node", broken_ledger)
+    failed = await wf.execute(dict(trade))
+    assert failed["errors"] == ["ledger: ledger down"]
+
+    monkeypatch.undo()
+    fixed = await wf.execute(dict(trade))
+    assert fixed["errors"] is None
+    assert completed_agent_names(fixed["completed_mask"]) == list(AGENT_BITS)
+    TradeProcessingWorkflow._AGENT_REGISTRY.clear()
+
+
+async def test_checkpointing_works_with_the_default_serde(fake_model, trade):
+    TradeProcessingWorkflow._AGENT_REGISTRY.clear()
+    wf = TradeProcessingWorkflow("test-project", checkpointer=InMemorySaver())
+    wf.regulatory_agent.model = fake_model
+
+    result = await wf.execute(MappingProxyType(dict(trade)))
+    assert result["errors"] is None
+    assert completed_agent_names(result["completed_mask"]) == list(AGENT_BITS)
+    assert result["inputs"]["trade_data"] == trade
+    TradeProcessingWorkflow._AGENT_REGISTRY.clear()
+
+
+def test_checkpointed_graphs_are_not_cached():
+    TradeProcessingWorkflow._AGENT_REGISTRY.clear()
+    shared = TradeProcessingWorkflow("test-project")
+    assert TradeProcessingWorkflow("test-project").workflow is shared.workflow
+
+    cached = len(TradeProcessingWorkflow._compiled_graph_cache)
+    saver = InMemorySaver()
+    wf = TradeProcessingWorkflow("test-project", checkpointer=saver)
+    assert wf.workflow.checkpointer is saver
+    assert len(TradeProcessingWorkflow._compiled_graph_cache) == cached
+    TradeProcessingWorkflow._AGENT_REGISTRY.clear()
+
+
+def test_list_extend_never_mutates_its_inputs():
+    left, right = ["a"], ["b"]
+
+    assert _list_extend(left, right) == ["a", "b"]
+    assert left == ["a"] and right == ["b"]
+    assert _list_extend(None, right) is right
+    assert _list_extend(left, None) is left
+    assert _list_extend(left, []) is left
+
+
+def test_merge_outputs_never_mutates_its_inputs():
+    left, right = {"trading": {"valid": True}}, {"processing": {}}
+
+    assert _merge_outputs(left, right) == {"trading": {"valid": True}, "processing": {}}
+    assert left == {"trading": {"valid": True}} and right == {"processing": {}}
+    assert _merge_outputs(None, right) is right
+    assert _merge_outputs(left, {}) is left
+
+
+async def test_fanout_errors_are_reported_once(workflow, trade, monkeypatch):
+    async def broken_ledger(state):
+        raise ValueError("ledger down")
+
+    monkeypatch.setattr(workflow, "_ledger_agent_node", broken_ledger)
+    result = await workflow.execute(trade)
+
+    assert result["errors"] == ["ledger: ledger down"]
+
+
+async def test_execute_leaves_the_callers_trade_untouched(workflow, trade):
+    frozen = MappingProxyType(dict(trade))
+    result = await workflow.execute(frozen)
+
+    assert dict(frozen) == trade
+    assert result["inputs"]["trade_data"] == trade
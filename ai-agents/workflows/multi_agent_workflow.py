@@ -4,34 +4,170 @@ Coordinates all 7 AI agents in a stateful workflow
 """
 
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, Annotated, List
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from typing import Any, AsyncIterator, TypedDict, Annotated, ClassVar, Dict, List, Mapping, Optional, Tuple, get_type_hints
+from dataclasses import dataclass, fields
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import math
 import operator
-from datetime import datetime
+import orjson
+import sys
+import uuid
+from types import MappingProxyType
 
 # Import AI agents
 from agents.regulatory_agent import RegulatoryAgent
 # Would import: TradingAgent, ProcessingAgent, ConfirmationAgent, SettlementAgent, LedgerAgent, MarginAgent
 
-class TradeWorkflowState(TypedDict):
-    """State shared across all agents in the workflow"""
+logger = logging.getLogger(__name__)
+
+_BANNER = "=" * 60
+
+class OrjsonSerializer:
+    """Checkpoint serde that encodes plain JSON values with orjson
+    
+    A value takes the orjson path only if it is built entirely from dicts with
+    str keys, lists, tuples, str, int, bool, None and finite floats. It then
+    decodes to what LangGraph's JsonPlusSerializer would give back; tuples come
+    back as lists from either, since msgpack has no tuple type. Anything else
+    (NaN and infinities, which orjson writes as null, dataclasses such as the
+    graph input, datetimes, subclasses, ...) goes to JsonPlusSerializer itself.
+    The one deliberate difference: read-only mappings such as the frozen trade
+    data, which JsonPlusSerializer cannot encode, are stored as dicts.
+    Use as `InMemorySaver(serde=OrjsonSerializer())`.
+    """
+    
+    _TYPE = "orjson"
+    _SCALARS = frozenset({str, int, bool, type(None)})
+    
+    def __init__(self, fallback: Optional[JsonPlusSerializer] = None):
+        self.fallback = fallback or JsonPlusSerializer()
+    
+    @classmethod
+    def _is_plain(cls, obj: Any) -> bool:
+        """Whether orjson decodes `obj` the way the fallback would (read-only mappings as dicts)"""
+        kind = type(obj)
+        if kind in cls._SCALARS:
+            return True
+        if kind is float:
+            return math.isfinite(obj)
+        if kind is list or kind is tuple:
+            return all(cls._is_plain(item) for item in obj)
+        if kind is dict or kind is MappingProxyType:
+            return all(type(k) is str and cls._is_plain(v) for k, v in obj.items())
+        return False
+    
+    @staticmethod
+    def _default(obj: Any):
+        if isinstance(obj, MappingProxyType):
+            return dict(obj)
+        raise TypeError
+    
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if self._is_plain(obj):
+            try:
+                return self._TYPE, orjson.dumps(obj, default=self._default)
+            except TypeError:   # ints beyond 64 bits
+                pass
+        return self.fallback.dumps_typed(obj)
+    
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ == self._TYPE:
+            return orjson.loads(payload)
+        return self.fallback.loads_typed(data)
+
+# LangGraph shares channel values between channel copies (the fresh read behind
+# conditional edges applies pending writes to such a copy), so reducers must never
+# mutate `left`. They skip the allocation whenever one side is empty instead.
+# Either side may also be None, the sentinel for a field no node has written yet.
+
+def _list_extend(left: Optional[list], right: Optional[list]) -> Optional[list]:
+    """State reducer that appends without copying when either side is empty"""
+    if not right:
+        return left
+    if not left:
+        return right
+    return left + right
+
+def _merge_outputs(left: Optional[dict], right: Optional[dict]) -> Optional[dict]:
+    """State reducer for agent outputs; each agent writes only its own slot"""
+    if not right:
+        return left
+    if not left:
+        return right
+    return {**left, **right}
+
+# One bit per agent for the completed_mask state field
+AGENT_BITS: Dict[str, int] = {
+    "trading": 1,
+    "processing": 2,
+    "regulatory": 4,
+    "confirmation": 8,
+    "settlement": 16,
+    "ledger": 32,
+    "margin": 64,
+}
+
+def completed_agent_names(mask: int) -> List[str]:
+    """Names of the agents whose bits are set in a completed_mask, in workflow order"""
+    return [name for name, bit in AGENT_BITS.items() if mask & bit]
+
+class TradeInputs(TypedDict):
+    """Trade context the agents read"""
     trade_id: str
-    trade_data: dict
+    trade_data: Mapping[str, Any]   # read-only view, shared by every node
     uti: str
     netting_set: str
+
+class AgentOutputs(TypedDict, total=False):
+    """One slot per agent, filled in as each agent completes"""
+    trading: dict           # validation result
+    processing: dict        # intercompany / netting result
+    regulatory: dict        # {"reports": [...]}
+    confirmation: dict      # {"status": ...}
+    settlement: dict        # {"instructions": [...]}
+    ledger: dict            # {"entries": [...]}
+    margin: dict            # SIMM result
+
+@dataclass(slots=True)
+class TradeWorkflowState:
+    """State shared across all agents in the workflow
     
-    # Agent outputs
-    validation_result: dict
-    processing_result: dict
-    regulatory_reports: Annotated[List[dict], operator.add]
-    confirmation_status: str
-    settlement_instructions: List[dict]
-    ledger_entries: Annotated[List[dict], operator.add]
-    margin_result: dict
+    A slotted dataclass rather than a TypedDict: LangGraph reads the channels from
+    its fields, and nodes get fixed-offset attribute access. Nodes still return
+    plain dict updates, and `ainvoke` still returns a dict.
+    
+    Accumulated fields start as None and are only materialized by the first
+    node that writes them. A field nothing wrote, such as `errors` on a clean
+    run, is still None in the final state.
+    """
+    inputs: TradeInputs
+    outputs: Annotated[Optional[AgentOutputs], _merge_outputs] = None
     
     # Workflow metadata
-    current_step: str
-    errors: Annotated[List[str], operator.add]
-    completed_agents: Annotated[List[str], operator.add]
+    current_step: str = "initialized"
+    proceed_key: str = "reject"   # route after processing, written by the trading agent
+    errors: Annotated[Optional[List[str]], _list_extend] = None
+    completed_mask: Annotated[int, operator.or_] = 0   # AGENT_BITS of the agents that ran
+
+# Field -> reducer, read from the Annotated hints, for applying node updates outside the graph
+_STATE_REDUCERS = {
+    name: hint.__metadata__[0]
+    for name, hint in get_type_hints(TradeWorkflowState, include_extras=True).items()
+    if hasattr(hint, "__metadata__")
+}
+
+def _apply_update(state: TradeWorkflowState, update: dict) -> None:
+    """Fold a node's update into a state the way the graph's channels would"""
+    for name, value in update.items():
+        reducer = _STATE_REDUCERS.get(name)
+        setattr(state, name, reducer(getattr(state, name), value) if reducer else value)
 
 class TradeProcessingWorkflow:
     """
@@ -43,200 +179,395 @@ class TradeProcessingWorkflow:
     Parallel execution after processing, conditional routing based on AI decisions
     """
     
-    def __init__(self, project_id: str):
+    # Functional agent -> the method implementing it, run by the fan-out node
+    _FUNCTIONAL_NODES: ClassVar[Dict[str, str]] = {
+        "regulatory": "_regulatory_agent_node",
+        "confirmation": "_confirmation_agent_node",
+        "settlement": "_settlement_agent_node",
+        "ledger": "_ledger_agent_node",
+        "margin": "_margin_agent_node",
+    }
+    
+    # Every trade field the regulatory agent's prompt or reports read. The reports
+    # embed per-trade values (notional, price, UTI), so only trades that agree on
+    # all of them can share a result: in practice this is a resubmission cache,
+    # and trades that differ only by notional miss it.
+    _REG_CACHE_FIELDS = (
+        "product_type",
+        "asset_class",
+        "buyer",
+        "buyer_jurisdiction",
+        "buyer_lei",
+        "seller",
+        "seller_jurisdiction",
+        "seller_lei",
+        "notional",
+        "price",
+        "currency",
+        "uti",
+        "document_uri",
+    )
+    _REG_CACHE_MAX = 1024
+    
+    # Placeholder agent results, built once as templates. Final states are handed to
+    # callers who may edit them, so each node returns its own copy: flat results are
+    # copied shallowly, nested ones deeply.
+    _VALIDATION_RESULT: ClassVar[dict] = {
+        "valid": True,
+        "state_transition": "BOOKED",
+        "ai_reasoning": "Trade passes all pre-trade checks based on credit, market risk, and operational capacity analysis"
+    }
+    _PROC_RESULT: ClassVar[dict] = {
+        "intercompany_detected": False,
+        "ai_reasoning": "No intercompany relationship detected between counterparties"
+    }
+    _CONFIRMATION_RESULT: ClassVar[dict] = {"status": "SENT"}
+    _SETTLEMENT_RESULT: ClassVar[dict] = {
+        "instructions": [
+            {"instruction_id": "SI-001", "amount": 100000, "status": "PENDING"}
+        ]
+    }
+    _LEDGER_RESULT: ClassVar[dict] = {
+        "entries": [
+            {"ledger": "TRADE", "entry_id": "TL-001"},
+            {"ledger": "POSITION", "entry_id": "PL-001"},
+            {"ledger": "CASH", "entry_id": "CL-001"}
+        ]
+    }
+    _MARGIN_RESULT: ClassVar[dict] = {
+        "total_im": 500000,
+        "delta_margin": 300000,
+        "vega_margin": 150000,
+        "curvature_margin": 50000
+    }
+    _NETTING_SET: ClassVar[str] = "NS-DEFAULT"
+    
+    # Graph node -> the method implementing it
+    _NODE_SPECS: ClassVar[Dict[str, str]] = {
+        "trading": "_trading_agent_node",
+        "processing": "_processing_agent_node",
+        "functional_fanout": "_functional_fanout_node",
+    }
+    
+    # Compiled graph shared by all checkpointer-free instances; the topology is fixed per class
+    _compiled_graph_cache: ClassVar[dict] = {}
+    
+    # One RegulatoryAgent per project for the whole process. The agent keeps no
+    # per-trade state (results are returned, never stored), so concurrent
+    # workflows can share it along with its model client.
+    _AGENT_REGISTRY: ClassVar[Dict[str, RegulatoryAgent]] = {}
+    
+    def __init__(self, project_id: str, checkpointer: Optional[BaseCheckpointSaver] = None):
         self.project_id = project_id
+        self.checkpointer = checkpointer
         
         # Initialize all AI agents
-        self.regulatory_agent = RegulatoryAgent(project_id)
+        agent = self._AGENT_REGISTRY.get(project_id)
+        if agent is None:
+            agent = self._AGENT_REGISTRY[project_id] = RegulatoryAgent(project_id)
+        self.regulatory_agent = agent
+        self._reg_process = agent.process_trade_for_reporting   # bound once for the hot node
         # Would initialize other agents similarly
         
-        # Build the graph
-        self.workflow = self._build_workflow()
+        # Regulatory results of resubmitted trades, keyed by a hash of every field the reports read
+        self._reg_cache: dict[str, list] = {}
+        
+        # Reuse the compiled graph; nodes find this instance through the run config.
+        # Only the checkpointer-free graph is cached: keying on saver instances would
+        # pin every saver, and the checkpoints it holds, for the life of the process
+        if checkpointer is None:
+            key = tuple(sorted(self._NODE_SPECS))
+            graph = self._compiled_graph_cache.get(key)
+            if graph is None:
+                graph = self._compiled_graph_cache[key] = self._build_workflow()
+        else:
+            graph = self._build_workflow(checkpointer)
+        self.workflow = graph
+        self._run_config = {"configurable": {"workflow": self}}
     
-    def _build_workflow(self) -> StateGraph:
+    async def _invoke(self, state: TradeWorkflowState) -> dict:
+        """Run the graph for one trade
+        
+        Every checkpointed run gets a thread of its own: resuming an earlier run's
+        thread would fold its errors and completed bits into this one.
+        """
+        if self.checkpointer is None:
+            return await self.workflow.ainvoke(state, config=self._run_config)
+        
+        # The checkpoint stores the input too, and the stock JsonPlusSerializer encodes
+        # neither the read-only trade view nor the dataclass around it, so hand the
+        # graph plain dicts; the trade becomes a copy the caller cannot see
+        graph_input = {f.name: getattr(state, f.name) for f in fields(state)}
+        graph_input["inputs"] = {**state.inputs, "trade_data": dict(state.inputs["trade_data"])}
+        thread_id = f"{state.inputs['trade_id']}:{uuid.uuid4().hex}"
+        config = {"configurable": {"workflow": self, "thread_id": thread_id}}
+        return await self.workflow.ainvoke(graph_input, config=config)
+    
+    @staticmethod
+    def _bind_node(method_name: str):
+        """Graph node that dispatches to the invoking workflow instance's method"""
+        async def node(state: TradeWorkflowState, config):
+            return await getattr(config["configurable"]["workflow"], method_name)(state)
+        node.__name__ = method_name
+        return node
+    
+    @classmethod
+    def _build_workflow(cls, checkpointer: Optional[BaseCheckpointSaver] = None) -> StateGraph:
         """Construct the LangGraph workflow"""
         
         workflow = StateGraph(TradeWorkflowState)
         
         # Add nodes (each is an AI agent)
-        workflow.add_node("trading", self._trading_agent_node)
-        workflow.add_node("processing", self._processing_agent_node)
-        workflow.add_node("parallel_agents", self._parallel_agents_node)
-        workflow.add_node("regulatory", self._regulatory_agent_node)
-        workflow.add_node("confirmation", self._confirmation_agent_node)
-        workflow.add_node("settlement", self._settlement_agent_node)
-        workflow.add_node("ledger", self._ledger_agent_node)
-        workflow.add_node("margin", self._margin_agent_node)
+        for name, method_name in cls._NODE_SPECS.items():
+            workflow.add_node(name, cls._bind_node(method_name))
         
         # Define edges (workflow routing)
         workflow.add_edge("trading", "processing")
         
-        # Conditional routing: AI decides if trade needs full processing
+        # Conditional routing: AI decides if trade needs full processing. The
+        # trading agent already wrote the route's key, so the router is a plain getter
         workflow.add_conditional_edges(
             "processing",
-            self._should_proceed_to_functional_agents,
+            cls._should_proceed_to_functional_agents,
             {
-                "proceed": "parallel_agents",
+                "proceed": "functional_fanout",
                 "reject": END
             }
         )
         
-        # Parallel agents node fans out to all functional agents
-        workflow.add_edge("parallel_agents", "regulatory")
-        workflow.add_edge("parallel_agents", "confirmation")
-        workflow.add_edge("parallel_agents", "settlement")
-        workflow.add_edge("parallel_agents", "ledger")
-        workflow.add_edge("parallel_agents", "margin")
-        
-        # All functional agents converge to END
-        for agent in ["regulatory", "confirmation", "settlement", "ledger", "margin"]:
-            workflow.add_edge(agent, END)
+        # Functional agents run concurrently inside the fan-out node, then converge to END
+        workflow.add_edge("functional_fanout", END)
         
         # Set entry point
         workflow.set_entry_point("trading")
         
-        return workflow.compile()
+        return workflow.compile(checkpointer=checkpointer)
     
-    async def _trading_agent_node(self, state: TradeWorkflowState) -> TradeWorkflowState:
+    async def _trading_agent_node(self, state: TradeWorkflowState) -> dict:
         """AI Trading Agent - Validation & Booking"""
-        print(f"[Workflow] Executing TradingAgent for trade {state['trade_id']}")
+        logger.debug("Executing %s for trade %s", "TradingAgent", state.inputs["trade_id"])
         
         # AI agent performs validation with reasoning
         # In production, would call actual AI agent
-        state["validation_result"] = {
-            "valid": True,
-            "state_transition": "BOOKED",
-            "ai_reasoning": "Trade passes all pre-trade checks based on credit, market risk, and operational capacity analysis"
+        result = dict(self._VALIDATION_RESULT)
+        return {
+            "outputs": {"trading": result},
+            "proceed_key": "proceed" if result["valid"] else "reject",
+            "completed_mask": AGENT_BITS["trading"],
+            "current_step": "trading_complete",
         }
-        state["completed_agents"].append("trading")
-        state["current_step"] = "trading_complete"
-        
-        return state
     
-    async def _processing_agent_node(self, state: TradeWorkflowState) -> TradeWorkflowState:
+    async def _processing_agent_node(self, state: TradeWorkflowState) -> dict:
         """AI Processing Agent - UTI, Intercompany, Netting"""
-        print(f"[Workflow] Executing ProcessingAgent for trade {state['trade_id']}")
+        inputs = state.inputs
+        logger.debug("Executing %s for trade %s", "ProcessingAgent", inputs["trade_id"])
         
-        state["uti"] = f"UTI-{state['trade_id']}"
-        state["netting_set"] = "NS-DEFAULT"
-        state["processing_result"] = {
-            "intercompany_detected": False,
-            "ai_reasoning": "No intercompany relationship detected between counterparties"
+        return {
+            "inputs": {**inputs, "uti": "UTI-" + inputs["trade_id"], "netting_set": self._NETTING_SET},
+            "outputs": {"processing": dict(self._PROC_RESULT)},
+            "completed_mask": AGENT_BITS["processing"],
+            "current_step": "processing_complete",
         }
-        state["completed_agents"].append("processing")
-        state["current_step"] = "processing_complete"
-        
-        return state
     
-    async def _parallel_agents_node(self, state: TradeWorkflowState) -> TradeWorkflowState:
-        """Fan-out node to trigger all functional agents in parallel"""
-        print(f"[Workflow] Fanning out to functional agents for trade {state['trade_id']}")
-        state["current_step"] = "parallel_execution"
-        return state
+    async def _functional_fanout_node(self, state: TradeWorkflowState) -> dict:
+        """Run all functional agents concurrently and merge their outputs"""
+        logger.debug("Fanning out to functional agents for trade %s", state.inputs["trade_id"])
+        
+        # Agents only read the shared state and return their own output slot,
+        # so every branch can be handed the same state without copying it
+        results = await asyncio.gather(
+            *(getattr(self, method)(state) for method in self._FUNCTIONAL_NODES.values()),
+            return_exceptions=True,
+        )
+        
+        outputs: dict = {}
+        completed = 0
+        errors: List[str] = []
+        for agent, result in zip(self._FUNCTIONAL_NODES, results):
+            if isinstance(result, BaseException):
+                errors.append(f"{agent}: {result}")
+                continue
+            outputs.update(result["outputs"])
+            completed |= result["completed_mask"]
+        
+        update = {
+            "outputs": outputs,
+            "completed_mask": completed,
+            "current_step": "functional_complete",
+        }
+        if errors:
+            update["errors"] = errors
+        return update
     
-    async def _regulatory_agent_node(self, state: TradeWorkflowState) -> TradeWorkflowState:
+    async def _regulatory_agent_node(self, state: TradeWorkflowState) -> dict:
         """AI Regulatory Agent - Multi-Jurisdiction Reporting"""
-        print(f"[Workflow] Executing RegulatoryAgent for trade {state['trade_id']}")
+        inputs = state.inputs
+        logger.debug("Executing %s for trade %s", "RegulatoryAgent", inputs["trade_id"])
+        
+        trade_data = inputs["trade_data"]
+        
+        # Intercompany trades, and trades to which no regime applies on either side, are not
+        # reportable; checked before the cache key because the memoized rule lookup is
+        # cheaper than hashing the trade
+        if state.outputs["processing"].get("intercompany_detected") or not self.regulatory_agent._check_jurisdiction(
+            trade_data.get("buyer_jurisdiction") or "",
+            trade_data.get("seller_jurisdiction") or "",
+            trade_data.get("product_type") or "",
+        ):
+            return {"outputs": {"regulatory": {"reports": []}}, "completed_mask": AGENT_BITS["regulatory"]}
         
-        # Call the actual AI agent
-        result = await self.regulatory_agent.process_trade_for_reporting(state["trade_data"])
+        key = hashlib.blake2b(
+            json.dumps(
+                {k: trade_data.get(k) for k in self._REG_CACHE_FIELDS}, sort_keys=True, default=str
+            ).encode(),
+            digest_size=16,
+        ).hexdigest()
         
-        state["regulatory_reports"] = result.get("reports_generated", [])
-        state["completed_agents"].append("regulatory")
+        # Reuse the reports of an equivalent trade (timestamps are those of the first run).
+        # The cache keeps its own copy and hands out copies, so a consumer editing its
+        # result cannot change what later trades are served
+        cached = self._reg_cache.get(key)
+        if cached is not None:
+            reports = copy.deepcopy(cached)
+        else:
+            # Call the actual AI agent
+            result = await self._reg_process(trade_data, inputs["trade_id"])
+            reports = result.get("reports_generated", [])
+            
+            # Rule-based fallback reports are not cached, so the next equivalent
+            # trade asks Gemini again once it is reachable
+            if not result.get("fallback"):
+                if len(self._reg_cache) >= self._REG_CACHE_MAX:
+                    self._reg_cache.pop(next(iter(self._reg_cache)))
+                self._reg_cache[key] = copy.deepcopy(reports)
         
-        return state
+        return {"outputs": {"regulatory": {"reports": reports}}, "completed_mask": AGENT_BITS["regulatory"]}
     
-    async def _confirmation_agent_node(self, state: TradeWorkflowState) -> TradeWorkflowState:
+    async def _confirmation_agent_node(self, state: TradeWorkflowState) -> dict:
         """AI Confirmation Agent - Document Generation & Matching"""
-        print(f"[Workflow] Executing ConfirmationAgent for trade {state['trade_id']}")
+        logger.debug("Executing %s for trade %s", "ConfirmationAgent", state.inputs["trade_id"])
         
-        state["confirmation_status"] = "SENT"
-        state["completed_agents"].append("confirmation")
-        
-        return state
+        return {"outputs": {"confirmation": dict(self._CONFIRMATION_RESULT)}, "completed_mask": AGENT_BITS["confirmation"]}
     
-    async def _settlement_agent_node(self, state: TradeWorkflowState) -> TradeWorkflowState:
+    async def _settlement_agent_node(self, state: TradeWorkflowState) -> dict:
         """AI Settlement Agent - Netting & SWIFT"""
-        print(f"[Workflow] Executing SettlementAgent for trade {state['trade_id']}")
-        
-        state["settlement_instructions"] = [
-            {"instruction_id": "SI-001", "amount": 100000, "status": "PENDING"}
-        ]
-        state["completed_agents"].append("settlement")
+        logger.debug("Executing %s for trade %s", "SettlementAgent", state.inputs["trade_id"])
         
-        return state
+        return {"outputs": {"settlement": copy.deepcopy(self._SETTLEMENT_RESULT)}, "completed_mask": AGENT_BITS["settlement"]}
     
-    async def _ledger_agent_node(self, state: TradeWorkflowState) -> TradeWorkflowState:
+    async def _ledger_agent_node(self, state: TradeWorkflowState) -> dict:
         """AI Ledger Agent - Multi-Ledger Bookkeeping"""
-        print(f"[Workflow] Executing LedgerAgent for trade {state['trade_id']}")
-        
-        state["ledger_entries"] = [
-            {"ledger": "TRADE", "entry_id": "TL-001"},
-            {"ledger": "POSITION", "entry_id": "PL-001"},
-            {"ledger": "CASH", "entry_id": "CL-001"}
-        ]
-        state["completed_agents"].append("ledger")
+        logger.debug("Executing %s for trade %s", "LedgerAgent", state.inputs["trade_id"])
         
-        return state
+        return {"outputs": {"ledger": copy.deepcopy(self._LEDGER_RESULT)}, "completed_mask": AGENT_BITS["ledger"]}
     
-    async def _margin_agent_node(self, state: TradeWorkflowState) -> TradeWorkflowState:
+    async def _margin_agent_node(self, state: TradeWorkflowState) -> dict:
         """AI Margin Agent - ISDA SIMM Calculation"""
-        print(f"[Workflow] Executing MarginAgent for trade {state['trade_id']}")
-        
-        state["margin_result"] = {
-            "total_im": 500000,
-            "delta_margin": 300000,
-            "vega_margin": 150000,
-            "curvature_margin": 50000
-        }
-        state["completed_agents"].append("margin")
+        logger.debug("Executing %s for trade %s", "MarginAgent", state.inputs["trade_id"])
         
-        return state
+        return {"outputs": {"margin": dict(self._MARGIN_RESULT)}, "completed_mask": AGENT_BITS["margin"]}
     
-    def _should_proceed_to_functional_agents(self, state: TradeWorkflowState) -> str:
-        """AI-based conditional routing"""
-        if state["validation_result"].get("valid"):
-            return "proceed"
-        return "reject"
+    @staticmethod
+    def _should_proceed_to_functional_agents(state: TradeWorkflowState) -> str:
+        """AI-based conditional routing on the trading agent's decision"""
+        return state.proceed_key
     
-    async def execute(self, trade_data: dict) -> dict:
+    def _make_initial_state(self, trade_data: Mapping[str, Any]) -> TradeWorkflowState:
+        """Build the initial graph state for one trade"""
+        
+        # No node mutates the trade, so it travels as a read-only view that every
+        # branch can share rather than copy
+        return TradeWorkflowState(
+            inputs=TradeInputs(
+                trade_id=trade_data.get("trade_id") or trade_data.get("id", "TRD-001"),
+                trade_data=MappingProxyType(trade_data),
+                uti="",
+                netting_set="",
+            ),
+        )
+    
+    async def execute(self, trade_data: Mapping[str, Any]) -> dict:
         """Execute the full multi-agent workflow"""
         
         # Initialize state
-        initial_state = TradeWorkflowState(
-            trade_id=trade_data.get("id", "TRD-001"),
-            trade_data=trade_data,
-            uti="",
-            netting_set="",
-            validation_result={},
-            processing_result={},
-            regulatory_reports=[],
-            confirmation_status="",
-            settlement_instructions=[],
-            ledger_entries=[],
-            margin_result={},
-            current_step="initialized",
-            errors=[],
-            completed_agents=[]
-        )
+        initial_state = self._make_initial_state(trade_data)
         
         # Run workflow
-        print(f"\n{'='*60}")
-        print(f"Starting Multi-Agent Workflow for Trade: {initial_state['trade_id']}")
-        print(f"{'='*60}\n")
+        logger.info(
+            "\n%s\nStarting Multi-Agent Workflow for Trade: %s\n%s",
+            _BANNER, initial_state.inputs["trade_id"], _BANNER,
+        )
         
-        final_state = await self.workflow.ainvoke(initial_state)
+        final_state = await self._invoke(initial_state)
         
-        print(f"\n{'='*60}")
-        print(f"Workflow Complete - Agents Executed: {final_state['completed_agents']}")
-        print(f"{'='*60}\n")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "\n%s\nWorkflow Complete - Agents Executed: %s\n%s",
+                _BANNER, completed_agent_names(final_state["completed_mask"]), _BANNER,
+            )
         
         return final_state
-
+    
+    async def execute_stream(self, trade_data: Mapping[str, Any]) -> AsyncIterator[Tuple[str, dict]]:
+        """Execute the workflow, yielding (agent, update) as each agent finishes
+        
+        Trading and processing run in order; the functional agents are then
+        yielded in completion order, so a consumer waiting on one report does not
+        wait for the slowest agent. An agent that fails yields an `errors` update.
+        Closing the generator early cancels the agents still running.
+        The nodes are driven directly rather than through the graph, so no
+        checkpoints are written.
+        """
+        state = self._make_initial_state(trade_data)
+        
+        for agent in ("trading", "processing"):
+            update = await getattr(self, self._NODE_SPECS[agent])(state)
+            _apply_update(state, update)
+            yield agent, update
+        
+        if self._should_proceed_to_functional_agents(state) != "proceed":
+            return
+        
+        async def run(agent: str, method: str) -> Tuple[str, dict]:
+            try:
+                return agent, await getattr(self, method)(state)
+            except Exception as exc:
+                return agent, {"errors": [f"{agent}: {exc}"]}
+        
+        # Own the tasks, so a consumer that stops early (or is cancelled) does not
+        # leave the remaining agents running detached
+        tasks = [asyncio.create_task(run(agent, method)) for agent, method in self._FUNCTIONAL_NODES.items()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def execute_batch(self, trades: List[Mapping[str, Any]], return_exceptions: bool = False) -> list:
+        """Execute the workflow for several trades concurrently
+        
+        With return_exceptions, a failed trade yields its exception in place of a
+        final state instead of failing the whole batch.
+        """
+        states = [self._make_initial_state(trade_data) for trade_data in trades]
+        logger.info("Starting Multi-Agent Workflow for a batch of %d trades", len(states))
+        
+        return await asyncio.gather(
+            *(self._invoke(state) for state in states),
+            return_exceptions=return_exceptions,
+        )
 
 # Example usage
 if __name__ == "__main__":
-    import asyncio
+    # libuv-backed event loop for this script only: cheaper scheduling for the many
+    # short tasks the fan-out spawns. Importing the module never changes the loop.
+    try:
+        import uvloop
+    except ImportError:
+        uvloop = None
+    
+    logging.basicConfig(level=logging.INFO, format="[Workflow] %(message)s")
     
     workflow = TradeProcessingWorkflow(project_id="nextgen3")
     
@@ -254,11 +585,15 @@ if __name__ == "__main__":
         "currency": "USD"
     }
     
-    result = asyncio.run(workflow.execute(sample_trade))
+    if uvloop is not None and sys.version_info >= (3, 11):
+        result = uvloop.run(workflow.execute(sample_trade))
+    else:
+        result = asyncio.run(workflow.execute(sample_trade))
     
+    outputs = result["outputs"]
     print("\n Final Workflow State:")
-    print(f"  Regulatory Reports: {len(result['regulatory_reports'])}")
-    print(f"  Confirmation Status: {result['confirmation_status']}")
-    print(f"  Settlement Instructions: {len(result['settlement_instructions'])}")
-    print(f"  Ledger Entries: {len(result['ledger_entries'])}")
-    print(f"  Margin (Total IM): {result['margin_result'].get('total_im')}")
+    print(f"  Regulatory Reports: {len(outputs['regulatory']['reports'])}")
+    print(f"  Confirmation Status: {outputs['confirmation']['status']}")
+    print(f"  Settlement Instructions: {len(outputs['settlement']['instructions'])}")
+    print(f"  Ledger Entries: {len(outputs['ledger']['entries'])}")
+    print(f"  Margin (Total IM): {outputs['margin'].get('total_im')}")